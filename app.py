@@ -1,10 +1,22 @@
 import streamlit as st
 import json
+import hashlib
+import math
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import pypdf
+import diskcache
+import orjson
 import requests
 from dotenv import load_dotenv
+from pdf_text import extract_pdf_text
+from requests.adapters import HTTPAdapter
+from transformers import AutoTokenizer
+from urllib3.util.retry import Retry
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Load environment variables
 load_dotenv()
@@ -12,7 +24,12 @@ HUGGINGFACE_API_KEY = st.secrets.get("HUGGINGFACE_API_KEY", os.getenv("HUGGINGFA
 if not HUGGINGFACE_API_KEY:
     st.error("⚠️ Hugging Face API key not configured. Please set HUGGINGFACE_API_KEY in Streamlit secrets or environment variables.")
     st.stop()
-HF_API_URL = "https://router.huggingface.co/hf-inference/models/mistral-community/Mistral-7B-Instruct-v0.1"
+HF_MODEL_ID = "mistral-community/Mistral-7B-Instruct-v0.1"
+HF_API_URL = f"https://router.huggingface.co/hf-inference/models/{HF_MODEL_ID}"
+# Concurrent HF requests per server process; sizes both the worker pool and the HTTP connection pool
+HF_MAX_CONCURRENCY = 8
+# Client-side cap on HF requests per server process, to stay under the account's rate limit
+HF_REQUESTS_PER_MINUTE = int(os.getenv("HF_REQUESTS_PER_MINUTE", "60"))
 
 # Page configuration
 st.set_page_config(
@@ -33,89 +50,330 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Papers shown per page in the library
+LIBRARY_PAGE_SIZE = 25
+# Token budget for the paper content included in a prompt
+DOCUMENT_TOKENS = 512
+# Character budget used instead when the tokenizer cannot be loaded
+DOCUMENT_CHARS_FALLBACK = 1000
+
 # Initialize session state
 if 'papers' not in st.session_state:
     st.session_state.papers = []
 if 'comparison_result' not in st.session_state:
     st.session_state.comparison_result = None
+if 'analyzed_hashes' not in st.session_state:
+    st.session_state.analyzed_hashes = {}
 
-# Helper function to query Hugging Face API
-@st.cache_data(show_spinner=False)
-def query_huggingface(prompt, max_length=512):
-    """Query Hugging Face API for text generation"""
-    headers = {"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"}
+# Shared resources are built once per server process with st.cache_resource, not on every rerun
+
+# Shared HTTP session so every call reuses pooled keep-alive connections instead of a new TLS handshake
+@st.cache_resource(show_spinner=False)
+def get_session():
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {HUGGINGFACE_API_KEY}"
+    # Payloads are pre-encoded with orjson, so the content type is set here rather than via json=
+    session.headers["Content-Type"] = "application/json"
+    # pool_block makes extra callers wait for a pooled connection instead of opening throwaway ones
+    session.mount("https://", HTTPAdapter(
+        pool_connections=HF_MAX_CONCURRENCY,
+        pool_maxsize=HF_MAX_CONCURRENCY,
+        pool_block=True,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+    ))
+    return session
+
+# Token bucket shared by every session's worker threads
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter():
+    return {
+        "tokens": float(HF_REQUESTS_PER_MINUTE),
+        "updated": time.monotonic(),
+        "lock": threading.Lock()
+    }
+
+# Block until the token bucket allows another HF request
+def acquire_rate_limit():
+    limiter = get_rate_limiter()
+    rate = HF_REQUESTS_PER_MINUTE / 60
+    while True:
+        with limiter["lock"]:
+            now = time.monotonic()
+            limiter["tokens"] = min(HF_REQUESTS_PER_MINUTE, limiter["tokens"] + (now - limiter["updated"]) * rate)
+            limiter["updated"] = now
+            if limiter["tokens"] >= 1:
+                limiter["tokens"] -= 1
+                return
+            wait = (1 - limiter["tokens"]) / rate
+        time.sleep(wait)
+
+# Persistent response cache shared across sessions and restarts
+@st.cache_resource(show_spinner=False)
+def get_cache():
+    return diskcache.Cache("./.hf_cache")
+
+# Persistent paper analyses keyed by PDF content hash
+@st.cache_resource(show_spinner=False)
+def get_paper_cache():
+    return diskcache.Cache("./.paper_cache")
+
+# Tokenizer of the served model, so prompt budgets are counted in the tokens it actually sees.
+# Returns None when it cannot be loaded (Hub offline, repo gated, files missing). The None is cached
+# like any other result, so a failed load is not retried, and waited on, for every paper.
+@st.cache_resource(show_spinner=False)
+def get_tokenizer():
+    try:
+        return AutoTokenizer.from_pretrained(HF_MODEL_ID, token=HUGGINGFACE_API_KEY)
+    except Exception:
+        return None
+
+# Responses are cached under an exact hash of the prompt and generation length
+def cache_key(prompt, max_length):
+    return hashlib.sha256(f"{max_length}|{prompt}".encode()).hexdigest()
+
+def build_payload(prompt, max_length, stream=False):
     payload = {
         "inputs": prompt,
         "parameters": {
             "max_new_tokens": max_length,
             "temperature": 0.7,
-            "top_p": 0.95
+            "top_p": 0.95,
+            # Only the continuation is wanted; an echoed prompt would carry the template's headers
+            "return_full_text": False
         }
     }
-    
+    if stream:
+        payload["stream"] = True
+    return payload
+
+# Pull the generated text out of a non-streaming API response, or None if the format is unexpected
+def extract_generated_text(result, prompt):
+    if isinstance(result, list) and len(result) > 0:
+        generated_text = result[0].get('generated_text', '')
+        # Remove the prompt if the backend echoes it anyway. This must happen before stripping, since
+        # strip() would drop the prompt's trailing newline and the echo would no longer match.
+        if generated_text.startswith(prompt):
+            generated_text = generated_text[len(prompt):]
+        return generated_text.strip()
+    return None
+
+# Raised by query_huggingface when no usable generation comes back, so callers can tell an
+# API failure apart from an answer instead of parsing the error text
+class HuggingFaceError(Exception):
+    pass
+
+# Helper function to query Hugging Face API
+def query_huggingface(prompt, max_length=512, validate=None):
+    """Query Hugging Face API for text generation, reusing cached responses for repeat prompts.
+    A generation is only cached when validate (if given) accepts it. Raises HuggingFaceError on failure."""
     try:
-        response = requests.post(HF_API_URL, headers=headers, json=payload, timeout=30)
+        key = cache_key(prompt, max_length)
+        cached = get_cache().get(key)
+        if cached is not None:
+            return cached
+        
+        acquire_rate_limit()
+        response = get_session().post(HF_API_URL, data=orjson.dumps(build_payload(prompt, max_length)), timeout=30)
         if response.status_code == 200:
-            result = response.json()
-            if isinstance(result, list) and len(result) > 0:
-                generated_text = result[0].get('generated_text', '').strip()
-                # Remove the prompt from the generated text (Mistral includes prompt in response)
-                if generated_text.startswith(prompt):
-                    generated_text = generated_text[len(prompt):].strip()
-                return generated_text if generated_text else "No response generated"
-            return "Invalid response format"
+            generated_text = extract_generated_text(orjson.loads(response.content), prompt)
+            if generated_text is None:
+                raise HuggingFaceError("Invalid response format")
+            if not generated_text:
+                raise HuggingFaceError("No response generated")
+            # Only usable generations are cached so errors and malformed answers are retried on the next call
+            if validate is None or validate(generated_text):
+                get_cache().set(key, generated_text)
+            return generated_text
         else:
-            return f"API Error: {response.status_code}"
+            raise HuggingFaceError(f"API Error: {response.status_code}")
+    except HuggingFaceError:
+        raise
+    except Exception as e:
+        raise HuggingFaceError(f"Error querying API: {str(e)}") from e
+
+# Raised by stream_huggingface when the stream does not finish cleanly, so partial output plus an
+# error message is never mistaken for a real answer
+class StreamError(Exception):
+    pass
+
+# Streaming variant of query_huggingface for use with st.write_stream: yields text chunks as the
+# model generates them, parsed from the API's server-sent events. Cached responses are yielded whole.
+# Failures raise StreamError instead of yielding an error string.
+def stream_huggingface(prompt, max_length=512, validate=None):
+    try:
+        key = cache_key(prompt, max_length)
+        cached = get_cache().get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        acquire_rate_limit()
+        payload = orjson.dumps(build_payload(prompt, max_length, stream=True))
+        with get_session().post(HF_API_URL, data=payload, timeout=30, stream=True) as response:
+            if response.status_code != 200:
+                raise StreamError(f"API Error: {response.status_code}")
+            
+            if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                # The backend answered without streaming; fall back to the regular JSON response
+                generated_text = extract_generated_text(orjson.loads(response.content), prompt)
+                if generated_text is None:
+                    raise StreamError("Invalid response format")
+                chunks = [generated_text]
+                yield generated_text
+            else:
+                chunks = []
+                for line in response.iter_lines():
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[len(b"data:"):].strip()
+                    if data == b"[DONE]":
+                        break
+                    frame = orjson.loads(data)
+                    if "error" in frame:
+                        raise StreamError(f"API Error: {frame['error']}")
+                    token = frame.get("token") or {}
+                    if token.get("text") and not token.get("special"):
+                        chunks.append(token["text"])
+                        yield token["text"]
+        
+        generated_text = "".join(chunks).strip()
+        if not generated_text:
+            raise StreamError("No response generated")
+        # Only usable generations are cached so errors and malformed answers are retried on the next call
+        if validate is None or validate(generated_text):
+            get_cache().set(key, generated_text)
+    except StreamError:
+        raise
     except Exception as e:
-        return f"Error querying API: {str(e)}"
+        raise StreamError(f"Error querying API: {str(e)}") from e
+
+# Prompt templates and response parsers are built once at import instead of on every call.
+# DOCUMENT_PREFIX must stay byte-identical (same whitespace and "---" separator) across every
+# prompt about a paper, otherwise backend prefix-cache reuse is lost. Task text goes after it.
+DOCUMENT_PREFIX = "Document Title: {title}\nDocument Content: {content}\n\n---\n"
+
+ANALYSIS_TASK = """Task: Analyze this research paper and provide:
+1. A brief executive summary (100-150 words)
+2. 3-5 key findings as bullet points
+3. A description of the research methodology (50-100 words)
+
+Respond using exactly these headers on their own lines:
+[SUMMARY]: ...
+[FINDINGS]:
+- ...
+[METHOD]: ...
+Answer:
+"""
+
+COMPARISON_TEMPLATE = """{papers_text}
+
+---
+Answer ALL three tasks in order, using the headers [AGREE], [CONTRA] and [GAPS] on their own lines:
+1) 2-3 areas of agreement between the papers
+2) Contradictions or differences between the papers
+3) Research gaps that can be identified from the papers
+
+[AGREE]: ...
+[CONTRA]: ...
+[GAPS]: ...
+Answer:
+"""
 
-# Extract PDF text
-def extract_pdf_text(pdf_file):
+ANALYSIS_LABELS = ("SUMMARY", "FINDINGS", "METHOD")
+COMPARISON_LABELS = ("AGREE", "CONTRA", "GAPS")
+ANALYSIS_HEADER_RE = re.compile(r'\[(SUMMARY|FINDINGS|METHOD)\]:\s*')
+COMPARISON_HEADER_RE = re.compile(r'\[(AGREE|CONTRA|GAPS)\]:\s*')
+# A section body that only repeats the template's placeholder ("...", "- ...")
+PLACEHOLDER_RE = re.compile(r'[\s\-.…]*')
+# Leading bullets ("-", "*", "•") and list numbers ("1.", "2)") on a finding line. The marker must be
+# followed by whitespace so decimals ("1.5x") and markdown emphasis ("**Scaling**") are left alone.
+BULLET_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+')
+
+# Split a multi-section LLM response on its "[LABEL]:" headers
+def split_sections(response, header_re, labels):
+    parts = header_re.split(response or "")
+    sections = {}
+    # Splitting with a capture group yields [preamble, label, body, label, body, ...]
+    for label, body in zip(parts[1::2], parts[2::2]):
+        body = body.strip()
+        if body and label not in sections:
+            sections[label] = body
+    return {label: sections.get(label, "N/A") for label in labels}
+
+# True when the response contains every labeled section with real content, i.e. the model followed
+# the format. Bodies made only of the template's placeholders ("...", "- ...") do not count.
+def has_sections(response, header_re, labels):
+    return all(
+        body != "N/A" and PLACEHOLDER_RE.fullmatch(body) is None
+        for body in split_sections(response, header_re, labels).values()
+    )
+
+def document_prefix(title, text):
+    return DOCUMENT_PREFIX.format(title=title, content=truncate_tokens(text, DOCUMENT_TOKENS))
+
+# Cut text to at most max_tokens tokens of the served model
+def truncate_tokens(text, max_tokens):
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        # No tokenizer available: fall back to a character budget
+        return text[:DOCUMENT_CHARS_FALLBACK]
     try:
-        pdf_reader = pypdf.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text[:5000]  # First 5000 chars
-    except:
-        return "Error extracting PDF text"
+        ids = tokenizer.encode(text, add_special_tokens=False)
+    except Exception:
+        return text[:DOCUMENT_CHARS_FALLBACK]
+    if len(ids) <= max_tokens:
+        return text
+    return tokenizer.decode(ids[:max_tokens])
 
 # Analyze paper with Hugging Face
+# Runs on worker threads, so it must not touch st.session_state or render widgets
 def analyze_paper(title, text):
-    st.write("🔄 Analyzing with AI...")
+    # One request for all three analyses instead of one round-trip per analysis.
+    # The large document block comes first and the short task last, so prompts about the same
+    # paper share a byte-identical prefix that backends with prefix caching can reuse.
+    prompt = document_prefix(title, text) + ANALYSIS_TASK
     
-    # Create prompts for different analyses
-    prompts = {
-        "executive_summary": f"""Provide a brief executive summary (100-150 words) of this research paper:
-Title: {title}
-Content: {text[:1000]}
-Summary:""",
-        
-        "key_findings": f"""List 3-5 key findings from this research paper in bullet points:
-Title: {title}
-Content: {text[:1000]}
-Key Findings:""",
-        
-        "methodology": f"""Describe the research methodology used in this paper (50-100 words):
-Title: {title}
-Content: {text[:1000]}
-Methodology:"""
-    }
+    error = None
+    try:
+        response = query_huggingface(
+            prompt, max_length=900,
+            validate=lambda r: has_sections(r, ANALYSIS_HEADER_RE, ANALYSIS_LABELS)
+        )
+    except HuggingFaceError as e:
+        error = str(e)
+    
+    if error is not None:
+        results = {"executive_summary": "N/A", "key_findings": "N/A", "methodology": "N/A"}
+    elif not ANALYSIS_HEADER_RE.search(response):
+        # The model ignored the headers; keep its raw answer as the summary rather than discarding it
+        results = {"executive_summary": response.strip(), "key_findings": "N/A", "methodology": "N/A"}
+    else:
+        sections = split_sections(response, ANALYSIS_HEADER_RE, ANALYSIS_LABELS)
+        results = {
+            "executive_summary": sections["SUMMARY"],
+            "key_findings": sections["FINDINGS"],
+            "methodology": sections["METHOD"]
+        }
     
-    results = {}
-    for key, prompt in prompts.items():
-        response = query_huggingface(prompt, max_length=300)
-        # Clean up the response
-        results[key] = response.strip() if response else "N/A"
+    # Parse findings into a clean list once here so rendering just iterates it.
+    # Bullets and list numbers are dropped since the UI adds its own.
+    findings = [BULLET_RE.sub('', line).strip() for line in results["key_findings"].splitlines()]
+    findings = [f for f in findings if f]
     
     return {
-        "id": len(st.session_state.papers) + 1,
         "title": title,
         "authors": ["AI Extracted"],
         "abstract": text[:300] if text else "No content",
         "year": 2024,
         "executive_summary": results.get("executive_summary", "N/A"),
-        "key_findings": [f.strip() for f in results.get("key_findings", "N/A").split('\n') if f.strip()],
+        "key_findings": findings,
         "methodology": results.get("methodology", "N/A"),
         "sections": [
             {"title": "Abstract", "summary": text[:200]},
@@ -124,33 +382,70 @@ Methodology:"""
         ],
         "keywords": ["AI", "Research"],
         "category": "Computer Science",
-        "status": "completed"
+        "status": "failed" if error else "completed",
+        "error": error
     }
 
-# Compare papers with AI
+# True when all three analyses came back, so the paper is worth memoizing
+def analysis_complete(paper_data):
+    return (
+        paper_data["executive_summary"] != "N/A"
+        and paper_data["methodology"] != "N/A"
+        and paper_data["key_findings"] not in ([], ["N/A"])
+    )
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# Extract and analyze one uploaded file from its raw bytes
+# Identical PDFs are only analyzed once: results are memoized on disk by content hash
+def analyze_file(name, data, digest):
+    paper_data = analyze_paper(name.replace('.pdf', ''), extract_pdf_text(data))
+    # Incomplete analyses are not memoized so the paper is retried on the next upload
+    if analysis_complete(paper_data):
+        get_paper_cache().set(digest, paper_data)
+    return paper_data
+
+# Append an analyzed paper to the library, memoizing complete analyses for this session.
+# Cached analyses are shared by content, so the title always comes from the current upload's file name.
+def add_paper(digest, paper_data, file_name):
+    if analysis_complete(paper_data):
+        st.session_state.analyzed_hashes[digest] = paper_data
+    paper_data = dict(paper_data)
+    paper_data["title"] = file_name.replace('.pdf', '')
+    paper_data["id"] = len(st.session_state.papers) + 1
+    st.session_state.papers.append(paper_data)
+
+# Compare papers with AI; returns None after reporting a failed request
 def compare_papers(selected_papers):
     st.write("🔄 Comparing papers with AI...")
     
-    papers_text = "\n".join([f"{p['title']}: {p['executive_summary'][:200]}" for p in selected_papers])
+    papers_text = "\n".join([f"Paper {i}: {p['title']}: {p['executive_summary'][:200]}" for i, p in enumerate(selected_papers, 1)])
     
-    prompts = {
-        "agreements": f"""Find 2-3 areas of agreement between these research papers:
-{papers_text}
-Agreements:""",
-        
-        "contradictions": f"""Identify any contradictions or differences in these papers:
-{papers_text}
-Contradictions:""",
-        
-        "gaps": f"""What research gaps can be identified from these papers?
-{papers_text}
-Research Gaps:"""
-    }
+    # All papers and all three comparison tasks go into one request. The papers block leads so it
+    # is sent once and shared by every task, with the short instructions at the end.
+    prompt = COMPARISON_TEMPLATE.format(papers_text=papers_text)
     
-    results = {}
-    for key, prompt in prompts.items():
-        response = query_huggingface(prompt, max_length=400)
-        results[key] = response.strip() if response else "N/A"
+    # Stream the answer into a temporary placeholder so progress is visible while the model generates
+    placeholder = st.empty()
+    try:
+        with placeholder.container():
+            response = st.write_stream(stream_huggingface(
+                prompt, max_length=1200,
+                validate=lambda r: has_sections(r, COMPARISON_HEADER_RE, COMPARISON_LABELS)
+            ))
+    except StreamError as e:
+        # Whatever streamed before the failure is discarded rather than parsed as an answer
+        placeholder.empty()
+        st.error(f"⚠️ Comparison failed: {e}")
+        return None
+    placeholder.empty()
+    sections = split_sections(response, COMPARISON_HEADER_RE, COMPARISON_LABELS)
+    results = {
+        "agreements": sections["AGREE"],
+        "contradictions": sections["CONTRA"],
+        "gaps": sections["GAPS"]
+    }
     
     return {
         "papers": selected_papers,
@@ -183,6 +478,105 @@ Research Gaps:"""
         }
     }
 
+# Library and comparison views run as fragments, so their own widget events rerun
+# only the fragment rather than the whole script
+@st.fragment
+def render_library(papers):
+    # Compute all library metrics in a single pass over the papers
+    analyzed = 0
+    categories = set()
+    for p in papers:
+        if p["status"] == "completed":
+            analyzed += 1
+        categories.add(p.get("category"))
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Papers", len(papers))
+    with col2:
+        st.metric("Analyzed", analyzed)
+    with col3:
+        st.metric("Categories", len(categories))
+    
+    st.divider()
+    
+    # Only one page of expanders is built per rerun, so render cost stays flat as the library grows
+    query = st.text_input("Filter by title", key="library_filter").strip().lower()
+    matches = [p for p in papers if query in p['title'].lower()] if query else papers
+    page_count = max(1, math.ceil(len(matches) / LIBRARY_PAGE_SIZE))
+    page_number = st.number_input("Page", min_value=1, max_value=page_count, value=1) if page_count > 1 else 1
+    start = (page_number - 1) * LIBRARY_PAGE_SIZE
+    page_papers = matches[start:start + LIBRARY_PAGE_SIZE]
+    if not page_papers:
+        st.info("No papers match this filter.")
+    elif page_count > 1:
+        st.caption(f"Showing {start + 1}-{start + len(page_papers)} of {len(matches)} papers")
+    
+    for paper in page_papers:
+        with st.expander(f"📄 {paper['title']}"):
+            col1, col2 = st.columns([3, 1])
+            
+            with col1:
+                if paper.get('authors'):
+                    st.write(f"**Authors:** {', '.join(paper['authors'])}")
+                if paper.get('year'):
+                    st.write(f"**Year:** {paper['year']}")
+            
+            with col2:
+                if paper['status'] == 'completed':
+                    st.success("✓ Analyzed")
+                elif paper['status'] == 'failed':
+                    st.error("✗ Failed")
+                else:
+                    st.warning("⟳ Processing")
+            
+            if paper.get('error'):
+                st.error(paper['error'])
+            
+            if paper.get('executive_summary'):
+                st.write("**Executive Summary:**")
+                st.write(paper['executive_summary'])
+            
+            if paper.get('key_findings'):
+                st.write("**Key Findings:**")
+                for finding in paper['key_findings']:
+                    st.write(f"• {finding}")
+
+@st.fragment
+def render_comparison(result):
+    analysis = result['analysis']
+    
+    st.divider()
+    st.subheader("📈 AI Comparison Analysis")
+    
+    st.write("### Papers Analyzed")
+    for idx, p in enumerate(result['papers'], 1):
+        st.write(f"{idx}. **{p['title']}**")
+    
+    st.divider()
+    
+    if analysis.get('agreements'):
+        st.write("### ✅ Areas of Agreement")
+        for agreement in analysis['agreements']:
+            st.write(f"**{agreement['title']}**")
+            st.write(agreement['description'])
+    
+    if analysis.get('contradictions'):
+        st.write("### ⚠️ Contradictions")
+        for contradiction in analysis['contradictions']:
+            st.write(f"**{contradiction['title']}**")
+            st.write(contradiction['description'])
+    
+    if analysis.get('research_gaps'):
+        st.write("### 🔍 Research Gaps")
+        for gap in analysis['research_gaps']:
+            st.write(f"**{gap['gap']}**")
+            st.write(f"Impact: {gap['potential_impact']}")
+    
+    if st.button("🔄 New Comparison"):
+        st.session_state.comparison_result = None
+        st.rerun()
+
 # Sidebar
 st.sidebar.title("📚 ResearchAI")
 st.sidebar.write("Powered by Hugging Face 🤗")
@@ -195,38 +589,7 @@ if page == "Library":
     if not st.session_state.papers:
         st.info("No papers yet. Upload from 'Upload Paper' tab.")
     else:
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total Papers", len(st.session_state.papers))
-        with col2:
-            st.metric("Analyzed", len([p for p in st.session_state.papers if p["status"] == "completed"]))
-        with col3:
-            st.metric("Categories", len(set(p.get("category") for p in st.session_state.papers)))
-        
-        st.divider()
-        
-        for paper in st.session_state.papers:
-            with st.expander(f"📄 {paper['title']}"):
-                col1, col2 = st.columns([3, 1])
-                
-                with col1:
-                    if paper.get('authors'):
-                        st.write(f"**Authors:** {', '.join(paper['authors'])}")
-                    if paper.get('year'):
-                        st.write(f"**Year:** {paper['year']}")
-                
-                with col2:
-                    st.success("✓ Analyzed") if paper['status'] == 'completed' else st.warning("⟳ Processing")
-                
-                if paper.get('executive_summary'):
-                    st.write("**Executive Summary:**")
-                    st.write(paper['executive_summary'])
-                
-                if paper.get('key_findings'):
-                    st.write("**Key Findings:**")
-                    for finding in paper['key_findings']:
-                        if finding.strip():
-                            st.write(f"• {finding}")
+        render_library(st.session_state.papers)
 
 # UPLOAD PAGE
 elif page == "Upload Paper":
@@ -240,17 +603,62 @@ elif page == "Upload Paper":
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            for idx, file in enumerate(uploaded_files):
-                status_text.text(f"Processing: {file.name}")
-                pdf_text = extract_pdf_text(file)
-                paper_data = analyze_paper(file.name.replace('.pdf', ''), pdf_text)
-                st.session_state.papers.append(paper_data)
-                progress_bar.progress((idx + 1) / len(uploaded_files))
+            # Dedupe the batch by content hash before dispatching any work
+            unique_files = {}
+            for file in uploaded_files:
+                unique_files.setdefault(content_hash(file.getvalue()), file)
+            
+            done = 0
+            failures = []
+            pending = {}
+            for digest, file in unique_files.items():
+                if digest in st.session_state.analyzed_hashes:
+                    add_paper(digest, st.session_state.analyzed_hashes[digest], file.name)
+                    done += 1
+                else:
+                    pending[digest] = file
+            progress_bar.progress(done / len(unique_files))
+            
+            # Papers analyzed in an earlier session are reused from the disk cache
+            paper_cache = get_paper_cache()
+            to_analyze = {}
+            for digest, file in pending.items():
+                paper_data = paper_cache.get(digest)
+                if paper_data is None:
+                    to_analyze[digest] = file
+                else:
+                    add_paper(digest, paper_data, file.name)
+                    done += 1
+            progress_bar.progress(done / len(unique_files))
+            
+            status_text.text(f"Analyzing {len(to_analyze)} paper(s) with AI...")
+            
+            # Papers are extracted and analyzed concurrently since the work is bound on HF API latency;
+            # PDFium does its parsing in native code, so extraction does not need separate processes.
+            # Workers share this run's script context so cached calls behave as on the main thread.
+            ctx = get_script_run_ctx()
+            with ThreadPoolExecutor(max_workers=HF_MAX_CONCURRENCY, initializer=add_script_run_ctx, initargs=(None, ctx)) as executor:
+                futures = {
+                    executor.submit(analyze_file, file.name, file.getvalue(), digest): digest
+                    for digest, file in to_analyze.items()
+                }
+                for future in as_completed(futures):
+                    digest = futures[future]
+                    paper_data = future.result()
+                    add_paper(digest, paper_data, to_analyze[digest].name)
+                    if paper_data["status"] == "failed":
+                        failures.append((to_analyze[digest].name, paper_data["error"]))
+                    done += 1
+                    status_text.text(f"Processed: {to_analyze[digest].name}")
+                    progress_bar.progress(done / len(unique_files))
             
             status_text.empty()
             progress_bar.empty()
-            st.success(f"✓ Analyzed {len(uploaded_files)} paper(s) with Hugging Face!")
-            st.balloons()
+            for name, error in failures:
+                st.error(f"✗ {name}: {error}")
+            if len(failures) < len(unique_files):
+                st.success(f"✓ Analyzed {len(unique_files) - len(failures)} paper(s) with Hugging Face!")
+                st.balloons()
 
 # COMPARE PAGE
 elif page == "Compare Papers":
@@ -266,43 +674,14 @@ elif page == "Compare Papers":
             if st.button("🔍 Compare with AI", type="primary"):
                 with st.spinner("AI is comparing papers..."):
                     selected = [p for p in st.session_state.papers if p['title'] in selected_titles]
-                    st.session_state.comparison_result = compare_papers(selected)
-                st.success("✓ Comparison complete!")
+                    result = compare_papers(selected)
+                # A failed comparison has already been reported and leaves any earlier result in place
+                if result is not None:
+                    st.session_state.comparison_result = result
+                    st.success("✓ Comparison complete!")
         
         if st.session_state.comparison_result:
-            result = st.session_state.comparison_result
-            analysis = result['analysis']
-            
-            st.divider()
-            st.subheader("📈 AI Comparison Analysis")
-            
-            st.write("### Papers Analyzed")
-            for idx, p in enumerate(result['papers'], 1):
-                st.write(f"{idx}. **{p['title']}**")
-            
-            st.divider()
-            
-            if analysis.get('agreements'):
-                st.write("### ✅ Areas of Agreement")
-                for agreement in analysis['agreements']:
-                    st.write(f"**{agreement['title']}**")
-                    st.write(agreement['description'])
-            
-            if analysis.get('contradictions'):
-                st.write("### ⚠️ Contradictions")
-                for contradiction in analysis['contradictions']:
-                    st.write(f"**{contradiction['title']}**")
-                    st.write(contradiction['description'])
-            
-            if analysis.get('research_gaps'):
-                st.write("### 🔍 Research Gaps")
-                for gap in analysis['research_gaps']:
-                    st.write(f"**{gap['gap']}**")
-                    st.write(f"Impact: {gap['potential_impact']}")
-            
-            if st.button("🔄 New Comparison"):
-                st.session_state.comparison_result = None
-                st.rerun()
+            render_comparison(st.session_state.comparison_result)
 
 st.sidebar.divider()
 st.sidebar.caption("AI Research Paper Analyzer v2.0 - HF Edition")
@@ -0,0 +1,54 @@
+# PDF text extraction, kept separate from the Streamlit app so it can be used and tested on its own.
+# Nothing here may depend on Streamlit.
+
+import io
+import threading
+from contextlib import closing
+
+import pypdf
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+PDFIUM_LOCK = threading.Lock()
+
+# Returned in place of text when a PDF cannot be parsed
+EXTRACTION_ERROR = "Error extracting PDF text"
+
+# Yield page texts in order, using the native PDFium extractor when it is installed
+def iter_page_texts(data):
+    if pdfium is not None:
+        # PDFium is not thread-safe, so only one document is parsed at a time
+        with PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(data)
+            try:
+                for page in pdf:
+                    textpage = page.get_textpage()
+                    yield textpage.get_text_range().replace("\r\n", "\n")
+                    textpage.close()
+                    page.close()
+            finally:
+                pdf.close()
+    else:
+        # Parse from one in-memory buffer of the whole file; strict=False skips the expensive validation paths
+        pdf_reader = pypdf.PdfReader(io.BytesIO(data), strict=False)
+        for page in pdf_reader.pages:
+            yield page.extract_text() or ""
+
+# Extract PDF text from the raw bytes of an uploaded file
+def extract_pdf_text(data):
+    try:
+        parts = []
+        total = 0
+        # Stop at the first 5000 chars instead of extracting every page and slicing afterwards
+        with closing(iter_page_texts(data)) as page_texts:
+            for page_text in page_texts:
+                parts.append(page_text)
+                total += len(page_text)
+                if total >= 5000:
+                    break
+        return "".join(parts)[:5000]
+    except:
+        return EXTRACTION_ERROR